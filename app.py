@@ -1,10 +1,8 @@
 import streamlit as st
 import numpy as np
-import faiss
-import pickle
-import re
-import google.generativeai as genai
-from sentence_transformers import SentenceTransformer
+import os
+from query_batcher import BATCH_SIZE, get_batcher
+from text_utils import normalize_text
 
 # -------------------------
 # Configuration
@@ -13,34 +11,106 @@ COLLEGE_NAME = "Siliguri Institute of Technology"
 CONTACT_INFO = "+91‑9876543210 | info@sittech.edu.in"
 WEBSITE = "sittech.ac.in"
 
+# Embedding model (int8-quantized ONNX graph, exported by build_vector.py)
+EMBED_MODEL = "all-MiniLM-L6-v2"
+EMBED_DIR = "faiss_store/embedder"
+EMBED_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+# Gemini prompt template (built once)
+_PROMPT_PREFIX = f"Answer briefly as {COLLEGE_NAME} assistant: "
+_PROMPT_SUFFIX = f" Contact: {CONTACT_INFO} | Website: {WEBSITE}"
+
 # Preload models and resources (using cache)
 @st.cache_resource(show_spinner=False)
 def load_resources():
     """Load all heavy resources once and cache them"""
+    # Heavy imports live here so the first page paint doesn't wait on them
+    import orjson
+    import onnxruntime as ort
+    import google.generativeai as genai
+    from sentence_transformers import SentenceTransformer
+    
     resources = {}
+    cpus = os.cpu_count() or 2
+    faiss_threads = 0
     
-    # Load knowledge base
+    # Load knowledge base; build_vector.py records whether it built a FAISS
+    # index (large corpora) or only the raw embedding matrix
     try:
-        resources['index'] = faiss.read_index("faiss_store/index.faiss")
-        with open("faiss_store/data.pkl", "rb") as f:
-            resources['data'] = pickle.load(f)
+        resources['index'] = None
+        resources['emb_matrix'] = None
+        with open("faiss_store/data.json", "rb") as f:
+            resources['data'] = orjson.loads(f.read())
+        if resources['data'].get('search') == "faiss":
+            import faiss
+            faiss_threads = max(1, cpus // 2)
+            faiss.omp_set_num_threads(faiss_threads)
+            resources['index'] = faiss.read_index("faiss_store/index.faiss")
+        else:
+            resources['emb_matrix'] = np.ascontiguousarray(
+                np.load("faiss_store/embeddings.npy"), dtype=np.float32
+            )
     except Exception as e:
         st.error(f"Knowledge base error: {str(e)}")
         resources['index'] = None
+        resources['emb_matrix'] = None
         resources['data'] = None
     
     # Load embedding model
     try:
-        resources['embedder'] = SentenceTransformer("all-MiniLM-L6-v2")
-    except:
+        # The forward pass runs in onnxruntime; give it the cores FAISS doesn't use
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = max(1, cpus - faiss_threads)
+        session_options.inter_op_num_threads = 1
+        # Prefer the local export; fall back to the hub copy of the same graph
+        source = EMBED_DIR if os.path.isdir(EMBED_DIR) else EMBED_MODEL
+        resources['embedder'] = SentenceTransformer(
+            source,
+            backend="onnx",
+            model_kwargs={"file_name": EMBED_FILE, "session_options": session_options}
+        )
+    except Exception as e:
+        st.exception(e)
         resources['embedder'] = None
     
+    # Vector search needs all three; checked once here instead of every turn
+    has_vectors = resources['index'] is not None or resources['emb_matrix'] is not None
+    resources['ready'] = bool(resources['data'] and has_vectors and resources['embedder'])
+    
+    # Batch concurrent encodes and searches across sessions
+    if resources['ready']:
+        embedder = resources['embedder']
+        def encode_batch(texts):
+            return embedder.encode(
+                texts, batch_size=BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True
+            )
+        resources['encode_batcher'] = get_batcher('encode', encode_batch)
+        index, emb_matrix = resources['index'], resources['emb_matrix']
+        if index is not None:
+            def search_batch(vecs):
+                D, I = index.search(np.vstack(vecs), 1)
+                return list(zip(D[:, 0].tolist(), I[:, 0].tolist()))
+            resources['search'] = get_batcher('search', search_batch).submit
+        else:
+            # A matmul over the whole corpus takes microseconds; batching
+            # it would only add queueing overhead
+            def search_one(vec):
+                scores = emb_matrix @ vec
+                i = int(scores.argmax())
+                return float(scores[i]), i
+            resources['search'] = search_one
+    
     # Configure Gemini
     try:
         api_key = st.secrets["GEMINI_API_KEY"]
         genai.configure(api_key=api_key)
         resources['gemini_model'] = genai.GenerativeModel("gemini-1.5-flash")
-    except:
+        resources['gen_config'] = genai.types.GenerationConfig(
+            max_output_tokens=150,  # Shorter responses
+            temperature=0.3
+        )
+    except Exception as e:
+        st.warning(f"Gemini fallback unavailable: {str(e)}")
         resources['gemini_model'] = None
     
     return resources
@@ -48,16 +118,13 @@ def load_resources():
 # -------------------------
 # Helper Functions
 # -------------------------
-def normalize_text(text):
-    """Fast text normalization"""
-    text = text.lower().strip()
-    text = re.sub(r'[^\w\s]', '', text)
-    # Quick synonym replacements
-    text = re.sub(r'\b(hi|hello|hey|hlw|hii|greetings?)\b', 'greeting', text)
-    text = re.sub(r'\b(courses?|programs?|degrees?)\b', 'programs', text)
-    text = re.sub(r'\b(admission|apply|application)\b', 'admission', text)
-    text = re.sub(r'\b(hostel|dorm|stay)\b', 'hostel', text)
-    return re.sub(r'\s+', ' ', text)
+@st.cache_data(max_entries=512, show_spinner=False)
+def embed_query(norm, _batcher):
+    """Embed a normalized query once; repeats become a cache lookup.
+    
+    The leading underscore keeps the batcher out of the cache key.
+    """
+    return _batcher.submit(norm)
 
 def get_knowledge_response(query, resources):
     """Fast response from knowledge base"""
@@ -70,45 +137,144 @@ def get_knowledge_response(query, resources):
     if "greeting" in norm:
         return "Hi! How can I help you today?"
     
+    # Exact question hit skips the embedder
+    hit = resources['data'].get('exact', {}).get(norm)
+    if hit:
+        return hit
+    
     # Vector search
-    if resources['embedder'] and resources['index']:
+    if resources['ready']:
         try:
-            vec = resources['embedder'].encode([norm])
-            D, I = resources['index'].search(vec.astype("float32"), k=1)
-            if D[0][0] < 0.7:  # Good match threshold
-                return resources['data']['answers'][I[0][0]]
-        except:
-            pass
+            score, i = resources['search'](embed_query(norm, resources['encode_batcher']))
+            if score > 0.5:  # Cosine similarity threshold
+                return resources['data']['answers'][i]
+        except Exception as e:
+            st.warning(f"Knowledge search error: {str(e)}")
     return None
 
-def gemini_response(query, model):
-    """Optimized Gemini fallback"""
+def gemini_response(query, model, config=None):
+    """Optimized Gemini fallback, streamed chunk by chunk"""
     if not model:
-        return f"Please contact us: {CONTACT_INFO}"
+        yield f"Please contact us: {CONTACT_INFO}"
+        return
+    
+    from google.api_core.exceptions import GoogleAPIError
+    from google.generativeai.types import BlockedPromptException, StopCandidateException
     
+    limit = remaining = 300  # Limit response length
     try:
-        prompt = (
-            f"Answer briefly as {COLLEGE_NAME} assistant: {query} "
-            f"Contact: {CONTACT_INFO} | Website: {WEBSITE}"
-        )
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=150,  # Shorter responses
-                temperature=0.3
-            )
-        )
-        return response.text.strip()[:300]  # Limit response length
-    except:
-        return f"Please contact: {CONTACT_INFO}"
+        prompt = _PROMPT_PREFIX + query + _PROMPT_SUFFIX
+        response = model.generate_content(prompt, generation_config=config, stream=True)
+        for chunk in response:
+            text = chunk.text[:remaining]
+            if remaining == limit:
+                text = text.lstrip()  # Strip the slice, not the whole chunk
+            remaining -= len(text)
+            yield text
+            if remaining <= 0:
+                break
+    except (BlockedPromptException, StopCandidateException, GoogleAPIError,
+            ValueError, ConnectionError, TimeoutError):
+        # ValueError: chunk.text on a candidate with no text parts
+        if remaining == limit:
+            # Only when nothing was shown; a partial answer is kept as-is
+            yield f"Please contact: {CONTACT_INFO}"
 
 # -------------------------
 # Streamlit UI
 # -------------------------
-def main():
-    # Load all heavy resources (cached)
-    resources = load_resources()
+THEME_CSS = """
+<style>
+:root {
+    --primary: #2563eb;
+    --background: #0f172a;
+    --surface: #1e293b;
+    --text: #e2e8f0;
+}
+body, .stApp {
+    background-color: var(--background) !important;
+    color: var(--text) !important;
+    font-family: Arial, sans-serif;
+}
+.stChatMessage {
+    max-width: 85%;
+}
+.stChatMessage.user .message-content {
+    background-color: var(--primary);
+    border-radius: 18px;
+    padding: 12px 16px;
+    color: white;
+}
+.stChatMessage.assistant .message-content {
+    background-color: var(--surface);
+    border: 1px solid #334155;
+    border-radius: 18px;
+    padding: 12px 16px;
+}
+.token-counter {
+    position: fixed;
+    top: 70px;
+    right: 20px;
+    background: var(--surface);
+    padding: 4px 10px;
+    border-radius: 12px;
+    font-size: 0.8rem;
+    z-index: 100;
+}
+</style>
+"""
+
+def render_message(msg):
+    """Draw one chat turn"""
+    with st.chat_message(msg["role"], avatar="🧑" if msg["role"]=="user" else "🏫"):
+        st.markdown(f'<div class="message-content">{msg["content"]}</div>', unsafe_allow_html=True)
+
+@st.fragment
+def chat_area(resources, history):
+    """Chat input and token counter; new turns are appended to history.
+    
+    Submitting a message reruns only this fragment. Elements a fragment
+    writes into a container created outside it are not cleared on its
+    reruns, so each turn is drawn once into history and earlier turns stay
+    in place. Only widgets must live in the fragment body itself.
+    """
+    # Handle input
+    user_input = st.chat_input("Ask about our college...")
+    if user_input:
+        with history:
+            # Add user message immediately for responsiveness
+            user_msg = {"role": "user", "content": user_input}
+            render_message(user_msg)
+            st.session_state.messages.append(user_msg)
+            
+            # Get response
+            with st.spinner("Thinking..."):
+                # First try knowledge base
+                kb_response = get_knowledge_response(user_input, resources)
+        
+        # Add assistant response
+        with history, st.chat_message("assistant", avatar="🏫"):
+            if kb_response:
+                response = kb_response
+                st.markdown(f'<div class="message-content">{response}</div>', unsafe_allow_html=True)
+            else:
+                # Fallback to Gemini, painting chunks as they arrive, then
+                # swap in the styled reply so it matches earlier turns
+                slot = st.empty()
+                with slot.container():
+                    response = st.write_stream(gemini_response(
+                        user_input, resources.get('gemini_model'), resources.get('gen_config')
+                    ))
+                slot.markdown(f'<div class="message-content">{response}</div>', unsafe_allow_html=True)
+        
+        # Update tokens once on the full reply
+        st.session_state.token_count += len(response.split())
+        st.session_state.messages.append({"role": "assistant", "content": response})
     
+    # Token counter
+    st.markdown(f'<div class="token-counter">Tokens used: {st.session_state.token_count}</div>', unsafe_allow_html=True)
+
+def main():
     # Page setup
     st.set_page_config(
         page_title=f"{COLLEGE_NAME} Assistant",
@@ -116,47 +282,9 @@ def main():
         layout="centered"
     )
     
-    # Apply theme
-    st.markdown("""
-    <style>
-    :root {
-        --primary: #2563eb;
-        --background: #0f172a;
-        --surface: #1e293b;
-        --text: #e2e8f0;
-    }
-    body, .stApp {
-        background-color: var(--background) !important;
-        color: var(--text) !important;
-        font-family: Arial, sans-serif;
-    }
-    .stChatMessage {
-        max-width: 85%;
-    }
-    .stChatMessage.user .message-content {
-        background-color: var(--primary);
-        border-radius: 18px;
-        padding: 12px 16px;
-        color: white;
-    }
-    .stChatMessage.assistant .message-content {
-        background-color: var(--surface);
-        border: 1px solid #334155;
-        border-radius: 18px;
-        padding: 12px 16px;
-    }
-    .token-counter {
-        position: fixed;
-        top: 70px;
-        right: 20px;
-        background: var(--surface);
-        padding: 4px 10px;
-        border-radius: 12px;
-        font-size: 0.8rem;
-        z-index: 100;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    # Apply theme (full reruns only happen on session start; chat turns
+    # rerun just the chat_area() fragment)
+    st.markdown(THEME_CSS, unsafe_allow_html=True)
     
     # Initialize session
     if "messages" not in st.session_state:
@@ -170,40 +298,15 @@ def main():
         }]
         st.session_state.token_count = 0
     
-    # Display messages
-    for msg in st.session_state.messages:
-        with st.chat_message(msg["role"], avatar="🧑" if msg["role"]=="user" else "🏫"):
-            st.markdown(f'<div class="message-content">{msg["content"]}</div>', unsafe_allow_html=True)
-    
-    # Token counter
-    st.markdown(f'<div class="token-counter">Tokens used: {st.session_state.token_count}</div>', unsafe_allow_html=True)
+    # Display history once per full rerun; chat_area() appends new turns
+    history = st.container()
+    with history:
+        for msg in st.session_state.messages:
+            render_message(msg)
     
-    # Handle input
-    user_input = st.chat_input("Ask about our college...")
-    if user_input:
-        # Add user message immediately for responsiveness
-        with st.chat_message("user", avatar="🧑"):
-            st.markdown(f'<div class="message-content">{user_input}</div>', unsafe_allow_html=True)
-        st.session_state.messages.append({"role": "user", "content": user_input})
-        
-        # Get response
-        with st.spinner("Thinking..."):
-            # First try knowledge base
-            kb_response = get_knowledge_response(user_input, resources)
-            
-            if kb_response:
-                response = kb_response
-            else:
-                # Fallback to Gemini
-                response = gemini_response(user_input, resources.get('gemini_model'))
-            
-            # Update tokens
-            st.session_state.token_count += len(response.split())
-            
-            # Add assistant response
-            with st.chat_message("assistant", avatar="🏫"):
-                st.markdown(f'<div class="message-content">{response}</div>', unsafe_allow_html=True)
-            st.session_state.messages.append({"role": "assistant", "content": response})
+    # Load all heavy resources (cached) after the page chrome is painted
+    resources = load_resources()
+    chat_area(resources, history)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
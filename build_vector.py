@@ -1,10 +1,11 @@
 import pandas as pd
 import numpy as np
 import faiss
-import pickle
+import orjson
 import os
-import re
-from sentence_transformers import SentenceTransformer
+import onnxruntime as ort
+from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+from text_utils import normalize_series
 
 # -------------------------
 # Configuration
@@ -13,21 +14,14 @@ COLLEGE_NAME = "Siliguri Institute of Technology"
 CONTACT_INFO = "+91‑9876543210 | info@sittech.edu.in"
 WEBSITE = "sittech.ac.in"
 
-# -------------------------
-# Helper Functions
-# -------------------------
-def normalize_text(text):
-    """Simplify text for embedding"""
-    if not isinstance(text, str):
-        return ""
-    text = text.lower()
-    text = re.sub(r'[^\w\s]', '', text)
-    text = re.sub(r'\b(courses?|programs?|degrees?)\b', 'programs', text)
-    text = re.sub(r'\b(admission|apply|application)\b', 'admission', text)
-    text = re.sub(r'\b(hostel|dorm|accommodation)\b', 'hostel', text)
-    text = re.sub(r'\b(placement|jobs?|recruitment)\b', 'placement', text)
-    text = re.sub(r'\b(contact|phone|email|address)\b', 'contact', text)
-    return re.sub(r'\s+', ' ', text).strip()
+# Embedding model (int8-quantized ONNX graph, loaded by app.py)
+EMBED_MODEL = "all-MiniLM-L6-v2"
+EMBED_DIR = "faiss_store/embedder"
+EMBED_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+# Below this many rows the app scores queries with one numpy matmul;
+# larger corpora get an int8 HNSW FAISS index instead
+FAISS_MIN_ROWS = 10000
 
 # -------------------------
 # Load or Create Dataset
@@ -90,28 +84,69 @@ df = load_or_create_dataset()
 
 # Clean and normalize questions
 df["question"] = df["question"].fillna("")
-df["normalized"] = df["question"].apply(normalize_text)
+df["normalized"] = normalize_series(df["question"])
+
+# Export the int8-quantized embedder once so the app only loads the prebuilt graph
+if not os.path.exists(os.path.join(EMBED_DIR, EMBED_FILE)):
+    onnx_model = SentenceTransformer(EMBED_MODEL, backend="onnx")
+    onnx_model.save_pretrained(EMBED_DIR)
+    export_dynamic_quantized_onnx_model(onnx_model, "avx512_vnni", EMBED_DIR)
 
-# Generate embeddings
-model = SentenceTransformer("all-MiniLM-L6-v2")
-embeddings = model.encode(df["normalized"].tolist(), show_progress_bar=True)
-embeddings = np.array(embeddings).astype("float32")
+# Generate embeddings with the same graph used at query time, letting
+# onnxruntime (which runs the forward pass) use every core
+session_options = ort.SessionOptions()
+session_options.intra_op_num_threads = os.cpu_count() or 1
+model = SentenceTransformer(
+    EMBED_DIR,
+    backend="onnx",
+    model_kwargs={"file_name": EMBED_FILE, "session_options": session_options}
+)
 
-# Create and save index
-index = faiss.IndexFlatL2(embeddings.shape[1])
-index.add(embeddings)
+# Encode length-sorted batches to minimize padding, then restore row order
+texts = df["normalized"].tolist()
+order = np.argsort([len(t) for t in texts], kind="stable")
+embeddings = model.encode(
+    [texts[i] for i in order],
+    batch_size=64,
+    convert_to_numpy=True,
+    normalize_embeddings=True,
+    show_progress_bar=True
+)
+embeddings = embeddings[np.argsort(order)].astype(np.float32, copy=False)
+
+# Save unit-length embeddings (cosine similarity is a plain dot product)
 os.makedirs("faiss_store", exist_ok=True)
-faiss.write_index(index, "faiss_store/index.faiss")
+np.save("faiss_store/embeddings.npy", embeddings)
+
+# Create and save an int8 scalar-quantized HNSW index for large corpora only
+index_path = "faiss_store/index.faiss"
+search_mode = "faiss" if len(embeddings) >= FAISS_MIN_ROWS else "matmul"
+if search_mode == "faiss":
+    d = embeddings.shape[1]
+    index = faiss.IndexHNSWSQ(d, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+    index.train(embeddings)
+    index.add(embeddings)
+    faiss.write_index(index, index_path)
+elif os.path.exists(index_path):
+    os.remove(index_path)  # Unused by the matmul path
+
+# Exact-question lookup lets the app skip the embedder for known FAQs
+exact = {}
+for norm, answer in zip(df["normalized"], df["answer"]):
+    exact.setdefault(norm, answer)
 
 # Save knowledge data
-with open("faiss_store/data.pkl", "wb") as f:
-    pickle.dump({
+with open("faiss_store/data.json", "wb") as f:
+    f.write(orjson.dumps({
         "questions": df["question"].tolist(),
         "answers": df["answer"].tolist(),
         "departments": df["department"].tolist(),
-        "keywords": df["keywords"].tolist()
-    }, f)
+        "keywords": df["keywords"].tolist(),
+        "exact": exact,
+        "search": search_mode
+    }))
 
 print("✅ Vector store created successfully!")
 print(f"• {len(df)} Q&A pairs indexed")
+print(f"• Search: {search_mode}")
 print("Next: Run 'streamlit run app.py' to start the assistant")
\ No newline at end of file
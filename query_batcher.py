@@ -0,0 +1,91 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# -------------------------
+# Request Batching
+# -------------------------
+# Lives outside app.py because Streamlit re-executes the main script on every
+# rerun; module state here survives reruns and cache_resource reloads.
+BATCH_SIZE = 32
+BATCH_WAIT = 0.005  # seconds
+BATCH_TIMEOUT = 30  # seconds a caller waits before giving up
+
+class QueryBatcher:
+    """Coalesce concurrent single-item calls into one batched call.
+
+    Streamlit serves each session on its own thread; callers block in
+    submit() while a worker thread takes every item already queued (up to
+    max_batch), waits up to max_wait seconds for more only if that found
+    other callers, and runs fn (list of items -> list of results, one per
+    item) once over all of them.
+    """
+
+    def __init__(self, fn, max_batch=BATCH_SIZE, max_wait=BATCH_WAIT, timeout=BATCH_TIMEOUT):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.pending = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, item):
+        """Queue one item and wait for its result (TimeoutError if none)"""
+        future = Future()
+        self.pending.put((item, future))
+        return future.result(timeout=self.timeout)
+
+    def _drain(self, batch):
+        """Move items that are already waiting into batch, without blocking"""
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                return
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            self._drain(batch)
+            # Only wait for stragglers when other sessions are already queued;
+            # a lone caller runs immediately
+            if len(batch) > 1:
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self.pending.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+            items, futures = zip(*batch)
+            # Any failure is handed to the callers; the worker itself never exits
+            try:
+                results = list(self.fn(list(items)))
+                if len(results) != len(futures):
+                    raise ValueError(f"batch of {len(futures)} returned {len(results)} results")
+            except BaseException as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+def get_batcher(name, fn):
+    """Return the process-wide batcher for name, now running fn.
+
+    Reloading resources swaps in the new fn instead of starting another
+    worker thread, so each name keeps exactly one thread per process.
+    """
+    with _batchers_lock:
+        batcher = _batchers.get(name)
+        if batcher is None:
+            batcher = _batchers[name] = QueryBatcher(fn)
+        else:
+            batcher.fn = fn
+        return batcher
@@ -0,0 +1,37 @@
+import re
+
+# -------------------------
+# Text Normalization
+# -------------------------
+# Shared by build_vector.py (indexing) and app.py (queries) so both sides
+# reduce text to the same canonical terms.
+
+# Synonym -> canonical term, applied in a single regex pass
+_SYNONYMS = {
+    **dict.fromkeys(["hi", "hello", "hey", "hlw", "hii", "greeting", "greetings"], "greeting"),
+    **dict.fromkeys(["course", "courses", "program", "programs", "degree", "degrees"], "programs"),
+    **dict.fromkeys(["admission", "apply", "application"], "admission"),
+    **dict.fromkeys(["hostel", "dorm", "stay", "accommodation"], "hostel"),
+    **dict.fromkeys(["placement", "placements", "job", "jobs", "recruitment"], "placement"),
+    **dict.fromkeys(["contact", "phone", "email", "address"], "contact"),
+    **dict.fromkeys(["fee", "fees", "cost", "tuition"], "fees"),
+    **dict.fromkeys(["campus", "location", "where"], "location"),
+}
+_SYN = re.compile(r'\b(' + '|'.join(_SYNONYMS) + r')\b')
+_PUNCT = re.compile(r'[^\w\s]')
+_WS = re.compile(r'\s+')
+
+def normalize_text(text):
+    """Lowercase, drop punctuation and map synonyms to canonical terms"""
+    if not isinstance(text, str):
+        return ""
+    text = _PUNCT.sub('', text.lower())
+    text = _SYN.sub(lambda m: _SYNONYMS[m.group(0)], text)
+    return _WS.sub(' ', text).strip()
+
+def normalize_series(series):
+    """Vectorized normalize_text over a pandas Series of strings"""
+    s = series.str.lower().fillna("")
+    s = s.str.replace(_PUNCT, '', regex=True)
+    s = s.str.replace(_SYN, lambda m: _SYNONYMS[m.group(0)], regex=True)
+    return s.str.replace(_WS, ' ', regex=True).str.strip()